@@ -491,6 +491,7 @@ function App() {
             minZoom={3}
             maxBounds={[[-85, -180], [85, 180]]}
             maxBoundsViscosity={1.0}
+            preferCanvas={true}
             style={{ height: "100%", width: "100%" }}
           >
             <LayersControl position="topright">
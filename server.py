@@ -1,19 +1,35 @@
 import os
+import math
 import asyncio
-import requests
+import threading
+import time
+import httpx
 import uuid
+import hashlib
+import tempfile
+import orjson
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pyarrow import csv as pa_csv
 from pathlib import Path
+from functools import lru_cache
+from itertools import islice
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from cachetools import TTLCache
 from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from nomadicml import NomadicML
+from fastapi.middleware.gzip import GZipMiddleware
+from pydantic import BaseModel, Field, field_validator
 from dotenv import load_dotenv
-from typing import Optional
-from datetime import datetime, timedelta
-from openai import OpenAI
+from typing import Callable, Iterable, Optional
+from datetime import datetime
 
 # --- Configuration ---
 load_dotenv()
@@ -22,10 +38,32 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 if not OPENAI_API_KEY:
     print("Warning: OPENAI_API_KEY is missing. AI features will fail.")
+if not API_KEY:
+    print("Warning: NOMADIC_API_KEY is missing. Only the mock source will work.")
 
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+# SDK clients are imported and built on first use so boot (and mock mode) skips them
+@lru_cache(maxsize=1)
+def get_openai_client():
+    from openai import OpenAI
+    return OpenAI(api_key=OPENAI_API_KEY)
 
-app = FastAPI()
+@lru_cache(maxsize=1)
+def get_async_openai_client():
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=OPENAI_API_KEY)
+
+@lru_cache(maxsize=1)
+def get_nomadic_client():
+    from nomadicml import NomadicML
+    return NomadicML(api_key=API_KEY)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    if HTTP_CLIENT is not None:
+        await HTTP_CLIENT.aclose()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -34,15 +72,44 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-BATCH_EMBEDDINGS = {}
-BATCH_IDS = {}
-BATCH_DATA = {} 
+# GeoJSON bodies are repetitive text and compress several-fold; streamed slices are compressed as they go
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+@dataclass
+class BatchState:
+    embeddings: tuple[np.ndarray, np.ndarray]  # (int8 matrix, per-row scales), one row per distinct text
+    ids: np.ndarray  # event ids
+    rows: np.ndarray  # embedding row of each event
+    version: Optional[int] = None  # st_mtime_ns of the on-disk ids file, if persisted
+    content: Optional[str] = None  # hash of the embedded texts; None if any chunk failed
+    # query -> matching ids; lives on the state so a re-embedded batch starts empty
+    search_results: TTLCache = field(default_factory=lambda: TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL_SEC))
+
+# Bounded so long-running servers don't accumulate every batch ever loaded;
+# one entry per batch keeps embeddings and ids evicting together
+BATCH_STATE: TTLCache = TTLCache(maxsize=32, ttl=24 * 3600)
+# Features of each batch as last served by /api/visualize on this worker, for tiles;
+# TILE_INDEX holds the coordinate arrays derived from them
+BATCH_FEATURES: TTLCache = TTLCache(maxsize=32, ttl=24 * 3600)
+TILE_INDEX: TTLCache = TTLCache(maxsize=32, ttl=24 * 3600)
 
 class BatchRequest(BaseModel):
     batchId: Optional[str] = ""
     filter: Optional[str] = "all"
     source: Optional[str] = "live"
+    # Optional response window: events whose start lies in bbox (west, south, east, north),
+    # paged by event. Embeddings always cover the whole batch.
+    bbox: Optional[tuple[float, float, float, float]] = None
+    limit: Optional[int] = Field(default=None, ge=0)
+    offset: int = Field(default=0, ge=0)
+
+    @field_validator("bbox")
+    @classmethod
+    def _check_bbox(cls, bbox):
+        # west > east is allowed (antimeridian crossing); south > north is not
+        if bbox is not None and bbox[1] > bbox[3]:
+            raise ValueError("bbox must be [west, south, east, north] with south <= north")
+        return bbox
 
 class VideoRequest(BaseModel):
     videoId: str
@@ -51,18 +118,89 @@ class SearchRequest(BaseModel):
     batchId: str
     query: str
 
-VIDEO_CACHE = {}
+# Signed URLs expire upstream (~1h); evicting at 50 min means a cached URL still
+# has time left when the browser starts playing it
+VIDEO_URL_TTL_SEC = 3000
+VIDEO_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=VIDEO_URL_TTL_SEC)
+VIDEO_URL_INFLIGHT: dict[str, asyncio.Future] = {}
+# (raw get_batch_analysis response, event id prefix) per (batchId, filter); short-lived since a
+# batch can still be gaining results upstream
+BATCH_ANALYSIS_TTL_SEC = 300
+BATCH_ANALYSIS_CACHE: TTLCache = TTLCache(maxsize=64, ttl=BATCH_ANALYSIS_TTL_SEC)
+NOMADIC_API_URL = "https://api-prod.nomadicml.com"
+HTTP_CLIENT = None
+HTTP_CONNECT_RETRIES = 2
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIM = 1536
+EMBEDDING_CACHE_DIR = Path(__file__).parent / "embedding_cache"
+BATCH_CACHE_DIR = EMBEDDING_CACHE_DIR / "batches"
+EMBEDDING_MEMO_SIZE = 4096  # ~25 MB of 1536-dim float32; only absorbs repeat disk reads
+# Disk cache bounds: least recently used vectors/batches beyond these are deleted,
+# checked at most once per interval after new embeddings are written
+EMBEDDING_CACHE_MAX_FILES = 100_000  # ~600 MB of 1536-dim float32 vectors
+BATCH_CACHE_MAX_BATCHES = 256
+EMBEDDING_CACHE_PRUNE_INTERVAL_SEC = 3600
+LAST_CACHE_PRUNE = 0.0
+SCORE_BLOCK_ROWS = 2048
+EMBEDDING_CONCURRENCY = 5
+GEOJSON_CHUNK_FEATURES = 500
+SEARCH_THRESHOLD = 0.40
+SEARCH_CACHE_SIZE = 256
+SEARCH_CACHE_TTL_SEC = 600
+# Tiles below TILE_MAX_CLUSTER_ZOOM merge the points in each of TILE_CLUSTER_GRID^2 cells
+TILE_MAX_CLUSTER_ZOOM = 14
+TILE_CLUSTER_GRID = 8
+EMBEDDING_MEMO: OrderedDict[str, np.ndarray] = OrderedDict()
+EMBEDDING_MEMO_LOCK = threading.Lock()  # cache I/O runs in worker threads
 MOCK_CSV_PATH = Path(__file__).parent / "nomadic_data_5_csv.csv"
+MOCK_PARQUET_PATH = MOCK_CSV_PATH.with_suffix(".parquet")
+# Live events carry "m:ss" offsets; they are placed on a fixed synthetic timeline
+BASE_EPOCH_MS = int(datetime(2025, 1, 1, 12, 0, 0).timestamp() * 1000)
+DEFAULT_EVENT_DURATION_MS = 5000
+EVENT_DEDUP_DECIMALS = 6  # ~0.1 m; same video/label/time/position means a duplicate
 MOCK_DF = None
-
-def get_signed_video_url(video_id: str, force_refresh: bool = False) -> str:
-    if not force_refresh and video_id in VIDEO_CACHE: 
-        return VIDEO_CACHE[video_id]
-    
-    url = f"https://api-prod.nomadicml.com/api/video/{video_id}/signed-url"
-    headers = {"x-api-key": API_KEY}
+MOCK_DF_MTIME = None
+MOCK_FILTER_TEXT = None
+MOCK_COORDS = None
+MOCK_FILTER_COLUMNS = ["Label", "Category", "Query"]
+GPS_COLUMNS = ["Frame Gps Lat Start", "Frame Gps Lon Start", "Frame Gps Lat End", "Frame Gps Lon End"]
+MOCK_TEXT_COLUMNS = ["Analysis ID", "Label", "Severity", "Approval Status", "Timestamp", "Query", "Category", "Share Link"]
+
+def _get_http_client() -> httpx.AsyncClient:
+    # One pooled client so signed-URL fan-outs reuse TCP/TLS connections (and HTTP/2 streams)
+    global HTTP_CLIENT
+    if HTTP_CLIENT is None:
+        # Transport-level retries only cover failed connects, so re-sending the POST is safe
+        HTTP_CLIENT = httpx.AsyncClient(
+            base_url=NOMADIC_API_URL,
+            headers={"x-api-key": API_KEY or ""},
+            timeout=10,
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=HTTP_CONNECT_RETRIES,
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+            ),
+        )
+    return HTTP_CLIENT
+
+async def get_signed_video_url(video_id: str, force_refresh: bool = False) -> Optional[str]:
+    if not force_refresh:
+        cached = VIDEO_CACHE.get(video_id)
+        if cached:
+            return cached
+
+    # Concurrent misses for one video share a single upstream request; shield it so
+    # one caller disconnecting doesn't cancel the fetch for everyone else
+    task = VIDEO_URL_INFLIGHT.get(video_id)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_signed_video_url(video_id))
+        VIDEO_URL_INFLIGHT[video_id] = task
+        task.add_done_callback(lambda _: VIDEO_URL_INFLIGHT.pop(video_id, None))
+    return await asyncio.shield(task)
+
+async def _fetch_signed_video_url(video_id: str) -> Optional[str]:
     try:
-        response = requests.post(url, json={"method": "GET"}, headers=headers)
+        response = await _get_http_client().post(f"/api/video/{video_id}/signed-url", json={"method": "GET"})
         response.raise_for_status()
         data = response.json()
         if data.get("url"):
@@ -72,172 +210,597 @@ def get_signed_video_url(video_id: str, force_refresh: bool = False) -> str:
         print(f"Error fetching video URL: {e}")
         return None
 
-def timestamp_to_seconds(time_str: str) -> int:
+def timestamps_to_seconds(values) -> np.ndarray:
+    # Vectorized "m:ss" -> seconds; anything unparseable (or missing) is 0.
+    # Offsets repeat heavily, so only the distinct strings are parsed.
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object).fillna("").astype(str))
+    mm_ss = pd.Series(uniques, dtype=object).str.extract(r"^\s*(\d+):(\d+)\s*$").astype(float)
+    seconds = (mm_ss[0] * 60 + mm_ss[1]).fillna(0).astype(np.int64).to_numpy()
+    # A trailing 0 catches any NA sentinel code (-1) that slips through
+    return np.append(seconds, 0)[codes]
+
+# --- Persistent Embedding Cache ---
+def _embedding_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+def _load_embedding(key: str) -> Optional[np.ndarray]:
+    with EMBEDDING_MEMO_LOCK:
+        vec = EMBEDDING_MEMO.get(key)
+        if vec is not None:
+            EMBEDDING_MEMO.move_to_end(key)
+            return vec
+    path = EMBEDDING_CACHE_DIR / f"{key}.npy"
+    if not path.exists():
+        return None
     try:
-        minutes, seconds = map(int, time_str.split(':'))
-        return minutes * 60 + seconds
-    except:
-        return 0
+        vec = np.load(path)
+        os.utime(path)  # mtime doubles as last use for _prune_embedding_cache
+    except Exception as e:
+        print(f"Error reading cached embedding {key}: {e}")
+        return None
+    _remember_embedding(key, vec)
+    return vec
 
-def convert_to_iso_time(time_str: str, default_duration_sec: int = 0) -> int:
+def _store_embedding(key: str, embedding: list[float]) -> np.ndarray:
+    vec = np.asarray(embedding, dtype=np.float32)
+    _remember_embedding(key, vec)
     try:
-        if not time_str: return 0
-        seconds = timestamp_to_seconds(time_str)
-        base_time = datetime(2025, 1, 1, 12, 0, 0)
-        event_time = base_time + timedelta(seconds=seconds + default_duration_sec)
-        return int(event_time.timestamp() * 1000)
-    except:
+        EMBEDDING_CACHE_DIR.mkdir(exist_ok=True)
+        np.save(EMBEDDING_CACHE_DIR / f"{key}.npy", vec)
+    except OSError as e:
+        print(f"Error writing cached embedding {key}: {e}")
+    return vec
+
+def _remember_embedding(key: str, vec: np.ndarray):
+    with EMBEDDING_MEMO_LOCK:
+        EMBEDDING_MEMO[key] = vec
+        EMBEDDING_MEMO.move_to_end(key)
+        if len(EMBEDDING_MEMO) > EMBEDDING_MEMO_SIZE:
+            EMBEDDING_MEMO.popitem(last=False)
+
+def _lookup_embeddings(keys: list[str], texts: list[str]) -> tuple[dict, dict]:
+    vectors = {}
+    misses = {}
+    for key, text in zip(keys, texts):
+        if key in vectors or key in misses:
+            continue
+        vec = _load_embedding(key)
+        if vec is None:
+            misses[key] = text
+        else:
+            vectors[key] = vec
+    return vectors, misses
+
+def _remove_oldest(paths: list[Path], keep: int, siblings) -> int:
+    if len(paths) <= keep:
         return 0
+    def mtime(p):
+        try:
+            return p.stat().st_mtime
+        except OSError:
+            return 0.0
+    stale = sorted(paths, key=mtime)[:len(paths) - keep]
+    for p in stale:
+        for f in siblings(p):
+            try:
+                f.unlink()
+            except OSError:
+                pass  # already gone (another worker pruned it)
+    return len(stale)
+
+def _prune_embedding_cache():
+    global LAST_CACHE_PRUNE
+    now = time.time()
+    if now - LAST_CACHE_PRUNE < EMBEDDING_CACHE_PRUNE_INTERVAL_SEC:
+        return
+    LAST_CACHE_PRUNE = now
+    try:
+        vectors = list(EMBEDDING_CACHE_DIR.glob("*.npy"))
+        batches = list(BATCH_CACHE_DIR.glob("*.ids.json")) if BATCH_CACHE_DIR.exists() else []
+    except OSError as e:
+        print(f"Error scanning embedding cache: {e}")
+        return
+    removed = _remove_oldest(vectors, EMBEDDING_CACHE_MAX_FILES, lambda p: [p])
+    # ids file first, so other workers stop treating the batch as current
+    removed_batches = _remove_oldest(batches, BATCH_CACHE_MAX_BATCHES, lambda p: [
+        p, *(p.with_name(p.name.replace(".ids.json", suffix)) for suffix in (".q.npy", ".scale.npy", ".rows.npy"))
+    ])
+    if removed or removed_batches:
+        print(f"Pruned embedding cache: {removed} vectors, {removed_batches} batches.")
+
+# --- Quantized Batch Embeddings ---
+def _normalize_rows(mat: np.ndarray) -> np.ndarray:
+    # Unit rows make a plain dot product the cosine; zero (failed) rows stay zero
+    norms = np.linalg.norm(mat, axis=-1, keepdims=True)
+    return mat / np.where(norms > 0, norms, 1.0)
+
+def _quantize_embeddings(mat: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Symmetric int8 with one scale per row: 4x smaller than float32, <1% score error
+    mat = _normalize_rows(mat)
+    max_abs = np.abs(mat).max(axis=1)
+    scale = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+    q = np.rint(mat / scale[:, None]).astype(np.int8)
+    return q, scale
+
+def _similarity_scores(quantized: tuple[np.ndarray, np.ndarray], query: np.ndarray) -> np.ndarray:
+    # NumPy has no int8/fp16 BLAS kernels, so dequantize in blocks and let float32 SGEMV do the scan
+    q, scale = quantized
+    query = query.astype(np.float32, copy=False)
+    scores = np.empty(len(q), dtype=np.float32)
+    for i in range(0, len(q), SCORE_BLOCK_ROWS):
+        scores[i:i+SCORE_BLOCK_ROWS] = q[i:i+SCORE_BLOCK_ROWS].astype(np.float32) @ query
+    return scores * scale
+
+# --- Shared Batch Matrices ---
+# Each batch's quantized matrix is written once and memory-mapped, so every uvicorn
+# worker shares the same page-cached copy and can serve searches for batches
+# another worker embedded.
+def _batch_paths(batch_id: str) -> tuple[Path, Path, Path, Path]:
+    key = hashlib.sha256(batch_id.encode("utf-8")).hexdigest()[:16]
+    return (
+        BATCH_CACHE_DIR / f"{key}.q.npy",
+        BATCH_CACHE_DIR / f"{key}.scale.npy",
+        BATCH_CACHE_DIR / f"{key}.rows.npy",
+        BATCH_CACHE_DIR / f"{key}.ids.json",
+    )
+
+def _atomic_write(path: Path, write):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            write(fh)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+def _save_batch_state(batch_id: str, embeddings: tuple[np.ndarray, np.ndarray], ids: np.ndarray, rows: np.ndarray, content: Optional[str]) -> bool:
+    q_path, scale_path, rows_path, _ids_path = _batch_paths(batch_id)
+    try:
+        BATCH_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        _atomic_write(q_path, lambda fh: np.save(fh, embeddings[0]))
+        _atomic_write(scale_path, lambda fh: np.save(fh, embeddings[1]))
+        _atomic_write(rows_path, lambda fh: np.save(fh, rows))
+    except OSError as e:
+        print(f"Error persisting embeddings for {batch_id}: {e}")
+        return False
+    # ids last: its mtime is the version readers compare against
+    return _save_batch_ids(batch_id, ids, content) is not None
+
+def _save_batch_ids(batch_id: str, ids: np.ndarray, content: Optional[str]) -> Optional[int]:
+    ids_path = _batch_paths(batch_id)[3]
+    try:
+        BATCH_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        _atomic_write(ids_path, lambda fh: fh.write(orjson.dumps({"content": content, "ids": ids.tolist()})))
+        return ids_path.stat().st_mtime_ns
+    except OSError as e:
+        print(f"Error persisting event ids for {batch_id}: {e}")
+        return None
+
+def _load_batch_state(batch_id: str) -> Optional[BatchState]:
+    q_path, scale_path, rows_path, ids_path = _batch_paths(batch_id)
+    try:
+        version = ids_path.stat().st_mtime_ns
+        meta = orjson.loads(ids_path.read_bytes())
+        ids = np.asarray(meta["ids"], dtype=object)
+        q = np.load(q_path, mmap_mode="r")
+        scale = np.load(scale_path)
+        rows = np.load(rows_path)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Error loading embeddings for {batch_id}: {e}")
+        return None
+    if len(scale) != len(q) or len(rows) != len(ids) or (len(rows) and rows.max() >= len(q)):
+        return None  # caught another worker mid-write
+    return BatchState(embeddings=(q, scale), ids=ids, rows=rows, version=version, content=meta.get("content"))
+
+def _fresh_batch_state(batch_id: str, state: Optional[BatchState]) -> Optional[BatchState]:
+    # The given state, or the on-disk one if another worker (or restart) wrote a newer version
+    try:
+        version = _batch_paths(batch_id)[3].stat().st_mtime_ns
+    except OSError:
+        return state
+    if state is None or state.version is None or state.version < version:
+        loaded = _load_batch_state(batch_id)
+        if loaded is not None:
+            return loaded
+    return state
+
+def _get_batch_state(batch_id: str) -> Optional[BatchState]:
+    state = BATCH_STATE.get(batch_id)
+    fresh = _fresh_batch_state(batch_id, state)
+    if fresh is not state:
+        BATCH_STATE[batch_id] = fresh
+    return fresh
+
+def restore_batch_state(batch_id: str, state: Optional[BatchState], features: list[dict]) -> Optional[BatchState]:
+    # Reloading a batch with the same event texts reuses its persisted matrix;
+    # only the event ids (fresh per live response) need rewriting. Does disk and
+    # hashing work, so it runs in a thread and leaves installing the result to the caller.
+    state = _fresh_batch_state(batch_id, state)
+    if state is None or state.content is None:
+        return None
+    event_ids, texts = _event_texts(features)
+    if _content_key(texts) != state.content:
+        return None
+    ids = np.asarray(event_ids, dtype=object)
+    if not np.array_equal(ids, state.ids):
+        version = _save_batch_ids(batch_id, ids, state.content)
+        if version is None:
+            return None
+        state = BatchState(embeddings=state.embeddings, ids=ids, rows=state.rows, version=version, content=state.content)
+    return state
+
+def _content_key(texts: list[str]) -> str:
+    return hashlib.blake2b(orjson.dumps(texts), digest_size=16).hexdigest()
+
+def _event_texts(features: list[dict]) -> tuple[list[str], list[str]]:
+    texts = []
+    event_ids = []
+    seen_ids = set()
+    # One text per event; a moving event's path shares its point's id
+    for f in features:
+        props = f.get('properties', {})
+        event_id = props.get('id')
+        if event_id in seen_ids:
+            continue
+        seen_ids.add(event_id)
+        event_ids.append(event_id)
+        
+        def clean(val):
+            s = str(val)
+            # Filter out Pandas NaNs or None strings
+            if s.lower() in ['none', 'nan', '']: return ""
+            return s
+
+        l = clean(props.get('label'))
+        d = clean(props.get('description'))
+        s = clean(props.get('severity'))
+        
+        text = f"{l} {d} {s}".strip()
+        if not text: text = "event" # Fallback to avoid empty string errors
+        texts.append(text)
+
+    return event_ids, texts
+
+def _build_batch_state(batch_id: str, event_ids: list, keys: list[str], vectors: dict, content: Optional[str]) -> BatchState:
+    # Memory-mapped from disk when persisting works. Events often repeat the same
+    # text, so each distinct vector is stored once and events map onto their row.
+    unique_keys = list(dict.fromkeys(keys))
+    row_of = {k: i for i, k in enumerate(unique_keys)}
+    rows = np.fromiter((row_of[k] for k in keys), dtype=np.int32, count=len(keys))
+    embeddings = _quantize_embeddings(np.stack([vectors[k] for k in unique_keys]))
+    ids = np.asarray(event_ids, dtype=object)
+    state = None
+    if _save_batch_state(batch_id, embeddings, ids, rows, content):
+        state = _load_batch_state(batch_id)
+    if state is None:
+        state = BatchState(embeddings=embeddings, ids=ids, rows=rows, content=content)
+    return state
 
 # --- UPDATED: Batched & Sanitized Embedding Task ---
-def compute_embeddings_task(batch_id, features):
+async def compute_embeddings_task(batch_id, features):
     print(f"Background: Computing OpenAI embeddings for batch {batch_id}...")
     try:
-        texts = []
         # 1. Sanitize Inputs
-        for f in features:
-            props = f.get('properties', {})
-            
-            def clean(val):
-                s = str(val)
-                # Filter out Pandas NaNs or None strings
-                if s.lower() in ['none', 'nan', '']: return ""
-                return s
-
-            l = clean(props.get('label'))
-            d = clean(props.get('description'))
-            s = clean(props.get('severity'))
-            
-            text = f"{l} {d} {s}".strip()
-            if not text: text = "event" # Fallback to avoid empty string errors
-            texts.append(text)
-
+        event_ids, texts = _event_texts(features)
         if not texts:
             return
 
-        # 2. Process in Batches (OpenAI limit is ~2048 items)
+        # 2. Reuse cached vectors; only unseen texts go to OpenAI.
+        # Disk and numpy work runs in a thread so requests keep flowing meanwhile.
+        keys = [_embedding_key(t) for t in texts]
+        vectors, misses = await asyncio.to_thread(_lookup_embeddings, keys, texts)
+
+        # 3. Process misses in concurrent Batches (OpenAI limit is ~2048 items)
         BATCH_SIZE = 500
-        all_embeddings = []
-        
-        for i in range(0, len(texts), BATCH_SIZE):
-            chunk = texts[i:i+BATCH_SIZE]
-            if not chunk: continue
-            
-            try:
-                res = openai_client.embeddings.create(
-                    input=chunk,
-                    model="text-embedding-3-small"
+        miss_keys = list(misses)
+        chunks = [miss_keys[i:i+BATCH_SIZE] for i in range(0, len(miss_keys), BATCH_SIZE)]
+        semaphore = asyncio.Semaphore(EMBEDDING_CONCURRENCY)
+
+        async def embed_chunk(chunk_keys):
+            async with semaphore:
+                res = await get_async_openai_client().embeddings.create(
+                    input=[misses[k] for k in chunk_keys],
+                    model=EMBEDDING_MODEL
                 )
-                # Extract embeddings in order
-                all_embeddings.extend([d.embedding for d in res.data])
-            except Exception as e:
-                print(f"Error embedding chunk {i}: {e}")
-                # Append zeros to keep alignment if a chunk fails (rare)
-                all_embeddings.extend([[0.0]*1536] * len(chunk))
-
-        # 3. Cache Results
-        BATCH_EMBEDDINGS[batch_id] = np.array(all_embeddings)
-        BATCH_IDS[batch_id] = [f['properties']['id'] for f in features]
-        BATCH_DATA[batch_id] = { "features": features }
-        print(f"Embeddings cached for {batch_id}: {len(all_embeddings)} items.")
+            # Extract embeddings in order
+            return [d.embedding for d in res.data]
+
+        results = await asyncio.gather(*(embed_chunk(c) for c in chunks), return_exceptions=True)
+        complete = True
+        for i, (chunk_keys, result) in enumerate(zip(chunks, results)):
+            if isinstance(result, Exception):
+                print(f"Error embedding chunk {i * BATCH_SIZE}: {result}")
+                complete = False
+                # Zeros keep alignment if a chunk fails (rare); they are not persisted
+                for key in chunk_keys:
+                    vectors[key] = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+                continue
+            stored = await asyncio.to_thread(lambda: [_store_embedding(k, e) for k, e in zip(chunk_keys, result)])
+            vectors.update(zip(chunk_keys, stored))
+
+        # 4. Cache Results; only a fully embedded batch may be reused by restore_batch_state
+        content = _content_key(texts) if complete else None
+        state = await asyncio.to_thread(_build_batch_state, batch_id, event_ids, keys, vectors, content)
+        if misses:
+            await asyncio.to_thread(_prune_embedding_cache)
+        BATCH_STATE[batch_id] = state
+        print(f"Embeddings cached for {batch_id}: {len(keys)} items, {len(state.embeddings[0])} distinct ({len(misses)} new).")
         
     except Exception as e:
         print(f"Error computing embeddings: {e}")
 
-def _get_mock_df() -> pd.DataFrame:
-    global MOCK_DF
-    if MOCK_DF is not None:
-        return MOCK_DF
+def _mock_csv_mtime() -> float:
     if not MOCK_CSV_PATH.exists():
         raise FileNotFoundError(f"Mock CSV not found at {MOCK_CSV_PATH}")
-    MOCK_DF = pd.read_csv(MOCK_CSV_PATH)
-    return MOCK_DF
-
-def _parse_mock_timestamp_range(value: str) -> tuple[int, int]:
-    if not value:
-        return 0, 0
-    parts = str(value).replace("-", "–").split("–", 1)
-    start_str = parts[0].strip()
-    end_str = parts[1].strip() if len(parts) > 1 else start_str
-    return timestamp_to_seconds(start_str), timestamp_to_seconds(end_str)
+    return MOCK_CSV_PATH.stat().st_mtime
 
-def _mock_features(filter_text: Optional[str]) -> list[dict]:
-    df = _get_mock_df()
-    if filter_text and filter_text.lower() != "all":
-        needle = filter_text.lower()
-        mask = (
-            df["Label"].astype(str).str.lower().str.contains(needle, na=False)
-            | df["Category"].astype(str).str.lower().str.contains(needle, na=False)
-            | df["Query"].astype(str).str.lower().str.contains(needle, na=False)
-        )
-        df = df[mask]
+def _read_mock_table(csv_mtime: float):
+    # Parquet sidecar is written on first parse and reused until the CSV changes
+    try:
+        if MOCK_PARQUET_PATH.stat().st_mtime >= csv_mtime:
+            return pq.read_table(MOCK_PARQUET_PATH, memory_map=True)
+    except OSError:
+        pass
+    table = pa_csv.read_csv(MOCK_CSV_PATH)
+    try:
+        _atomic_write(MOCK_PARQUET_PATH, lambda fh: pq.write_table(table, fh))
+    except OSError as e:
+        print(f"Error writing Parquet sidecar: {e}")
+    return table
 
-    features: list[dict] = []
-    # Using fillna to avoid NaNs early
-    records = df.fillna("").to_dict(orient="records")
-    
-    for row in records:
-        try:
-            # Handle empty strings for coords
-            if row.get("Frame Gps Lat Start") == "": continue
-            lat_start = float(row.get("Frame Gps Lat Start"))
-            lon_start = float(row.get("Frame Gps Lon Start"))
-        except (TypeError, ValueError):
-            continue
+def _get_mock_df() -> pd.DataFrame:
+    global MOCK_DF, MOCK_DF_MTIME, MOCK_FILTER_TEXT, MOCK_COORDS
+    mtime = _mock_csv_mtime()
+    if MOCK_DF is not None and MOCK_DF_MTIME == mtime:
+        return MOCK_DF
+    df = _read_mock_table(mtime).to_pandas(types_mapper=pd.ArrowDtype)
+    # Lowercased filter columns and GPS floats are derived once per load, not per request
+    MOCK_FILTER_TEXT = [pc.utf8_lower(pa.array(df[col].fillna("").astype(str), type=pa.string())) for col in MOCK_FILTER_COLUMNS]
+    MOCK_COORDS = df[GPS_COLUMNS].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+    MOCK_DF = df
+    MOCK_DF_MTIME = mtime
+    return MOCK_DF
 
-        try:
-            lat_end = float(row.get("Frame Gps Lat End"))
-            lon_end = float(row.get("Frame Gps Lon End"))
-        except (TypeError, ValueError):
-            lat_end, lon_end = lat_start, lon_start
+def _mock_offsets(ts_ranges: pd.Series) -> np.ndarray:
+    # Start offset in seconds of each "m:ss–m:ss" range
+    starts = ts_ranges.astype(str).str.replace("-", "–", regex=False).str.split("–", n=1).str[0]
+    return timestamps_to_seconds(starts)
+
+def _event_features(props: dict, lon_start: float, lat_start: float, lon_end: float, lat_end: float) -> list[dict]:
+    # props is owned by the point feature; only a moving event's path needs its own copy
+    props["type"] = "point"
+    features = [{
+        "type": "Feature",
+        "geometry": { "type": "Point", "coordinates": [lon_start, lat_start] },
+        "properties": props
+    }]
+
+    if props["is_moving"]:
+        features.append({
+            "type": "Feature",
+            "geometry": {
+                "type": "LineString",
+                "coordinates": [[lon_start, lat_start], [lon_end, lat_end]]
+            },
+            "properties": {**props, "type": "path"}
+        })
 
-        # Handle empty strings for timestamps
-        try:
-            ts_start = int(float(row.get("unix_timestamp_start", 0) or 0) * 1000)
-            ts_end = int(float(row.get("unix_timestamp_end", 0) or 0) * 1000) or ts_start
-        except ValueError:
-            ts_start, ts_end = 0, 0
+    return features
 
-        if ts_end < ts_start: ts_end = ts_start
+def _mock_features(filter_text: Optional[str]) -> list[dict]:
+    # The CSV is static, so features are memoized per filter until the file changes.
+    # Callers share the returned list and must not mutate it.
+    return _build_mock_features((filter_text or "all").lower(), _mock_csv_mtime())
 
-        ts_range = row.get("Timestamp")
-        offset_start, _offset_end = _parse_mock_timestamp_range(ts_range)
+@lru_cache(maxsize=16)
+def _build_mock_features(needle: str, _mtime: float) -> list[dict]:
+    df = _get_mock_df()
+    # GPS columns as one float matrix; unparseable cells are NaN
+    coords = MOCK_COORDS
+    if needle != "all":
+        # Plain substring match in Arrow's C loop; the needle is not a regex
+        hits = [pc.match_substring(col, needle) for col in MOCK_FILTER_TEXT]
+        mask = pc.or_(pc.or_(hits[0], hits[1]), hits[2]).to_numpy(zero_copy_only=False)
+        df, coords = df[mask], coords[mask]
+
+    valid = np.isfinite(coords[:, :2]).all(axis=1)
+    # Overlapping inference windows can report an event twice; keep the first
+    valid[valid] = ~pd.DataFrame({
+        "video": df["Video ID"].to_numpy()[valid],
+        "label": df["Label"].to_numpy()[valid],
+        "time": df["Timestamp"].to_numpy()[valid],
+        "lat": coords[valid, 0].round(EVENT_DEDUP_DECIMALS),
+        "lon": coords[valid, 1].round(EVENT_DEDUP_DECIMALS),
+    }).duplicated().to_numpy()
+    coords, df = coords[valid], df[valid]  # boolean indexing copies, MOCK_COORDS stays intact
+
+    # A missing end point means the event did not move
+    no_end = ~np.isfinite(coords[:, 2:]).all(axis=1)
+    coords[no_end, 2:] = coords[no_end, :2]
+    lat_start, lon_start, lat_end, lon_end = coords.T
+    is_moving = (lat_start != lat_end) | (lon_start != lon_end)
+
+    unix_start = pd.to_numeric(df["unix_timestamp_start"], errors="coerce").fillna(0).to_numpy()
+    unix_end = pd.to_numeric(df["unix_timestamp_end"], errors="coerce").fillna(0).to_numpy()
+    ts_start = (unix_start * 1000).astype(np.int64)
+    ts_end = (unix_end * 1000).astype(np.int64)
+    ts_end = np.where(ts_end == 0, ts_start, ts_end)
+    ts_end = np.maximum(ts_end, ts_start)
+
+    # Using fillna to avoid NaNs early; string columns are derived column-wise
+    text = df[MOCK_TEXT_COLUMNS].fillna("").astype(str)
+    ids = text["Analysis ID"].to_numpy(dtype=object)
+    blank_ids = ids == ""
+    # Rows without an Analysis ID are keyed by their CSV row, stable across filters and reloads
+    ids[blank_ids] = [f"mock-{row}" for row in df.index[blank_ids].tolist()]
+    severity = text["Severity"].where(text["Severity"] != "", "low").str.lower()
+    description = (text["Query"] + " (" + text["Category"] + ")").str.strip()
+    offsets = _mock_offsets(text["Timestamp"])
 
+    features: list[dict] = []
+    rows = zip(
+        ids.tolist(), text["Label"].tolist(), severity.tolist(), text["Approval Status"].tolist(),
+        text["Timestamp"].tolist(), description.tolist(), text["Category"].tolist(), text["Share Link"].tolist(),
+        lat_start.tolist(), lon_start.tolist(), lat_end.tolist(), lon_end.tolist(),
+        is_moving.tolist(), ts_start.tolist(), ts_end.tolist(), offsets.tolist(),
+    )
+    for event_id, label, sev, status, ts_range, desc, category, share_link, \
+            lat_s, lon_s, lat_e, lon_e, moving, t_start, t_end, offset in rows:
         props = {
-            "id": str(row.get("Analysis ID") or uuid.uuid4()),
-            "label": row.get("Label"),
-            "severity": str(row.get("Severity") or "low").lower(),
-            "status": row.get("Approval Status", "Unknown"),
+            "id": event_id,
+            "label": label,
+            "severity": sev,
+            "status": status,
             "time_str": ts_range,
-            "timestamp": ts_start,
-            "timestamp_end": ts_end,
-            "description": f"{row.get('Query', '')} ({row.get('Category', '')})".strip(),
-            "category": row.get("Category"),
+            "timestamp": t_start,
+            "timestamp_end": t_end,
+            "description": desc,
+            "category": category,
             "video_id": None,
             "video_url": None,
-            "video_offset": offset_start,
-            "is_moving": (lat_start != lat_end) or (lon_start != lon_end),
-            "share_link": row.get("Share Link"),
+            "video_offset": offset,
+            "is_moving": moving,
+            "share_link": share_link,
         }
+        features.extend(_event_features(props, lon_s, lat_s, lon_e, lat_e))
 
-        features.append({
-            "type": "Feature",
-            "geometry": { "type": "Point", "coordinates": [lon_start, lat_start] },
-            "properties": {**props, "type": "point"}
-        })
+    return features
 
-        if props["is_moving"]:
+def _iter_geojson(features: Iterable[dict], on_complete: Optional[Callable[[list], None]] = None):
+    # A FeatureCollection emitted in orjson-serialized slices, so large batches start
+    # flowing while later features are still being built and never sit in memory as
+    # one blob. on_complete gets every feature, but only once the source is exhausted:
+    # a client disconnect cancels the stream and must not leave a truncated batch behind.
+    yield b'{"type":"FeatureCollection","features":['
+    features = iter(features)
+    streamed = []
+    first = True
+    while chunk := list(islice(features, GEOJSON_CHUNK_FEATURES)):
+        if on_complete is not None:
+            streamed.extend(chunk)
+        if not first:
+            yield b","
+        first = False
+        yield orjson.dumps(chunk)[1:-1]
+    if on_complete is not None:
+        on_complete(streamed)
+    yield b"]}"
+
+def _geojson_response(features: Iterable[dict], on_complete: Optional[Callable[[list], None]] = None) -> StreamingResponse:
+    # orjson bytes skip FastAPI's jsonable_encoder walk over every feature
+    return StreamingResponse(_iter_geojson(features, on_complete), media_type="application/geo+json")
+
+def _window_features(features: Iterable[dict], request: BatchRequest):
+    # A point and the path that follows it are kept or dropped together
+    west, south, east, north = request.bbox or (-180.0, -90.0, 180.0, 90.0)
+    skipped = emitted = 0
+    keep = False
+    for f in features:
+        if f["geometry"]["type"] != "Point":
+            if keep:
+                yield f
+            continue
+        lon, lat = f["geometry"]["coordinates"]
+        # west > east means the box crosses the antimeridian
+        in_lon = west <= lon <= east if west <= east else (lon >= west or lon <= east)
+        keep = in_lon and south <= lat <= north
+        if keep and skipped < request.offset:
+            skipped += 1
+            keep = False
+        if keep:
+            if request.limit is not None and emitted >= request.limit:
+                return
+            emitted += 1
+            yield f
+
+async def _embed_batch(batch_id: str, features: list[dict]):
+    # Starlette also runs this after a client disconnect; a stream that never finished
+    # leaves its feature list empty, so nothing partial is embedded
+    if not features:
+        return
+    # Recorded here, on the loop, rather than from the threadpool that drives the stream
+    BATCH_FEATURES[batch_id] = features
+    restored = await asyncio.to_thread(restore_batch_state, batch_id, BATCH_STATE.get(batch_id), features)
+    if restored is not None:
+        BATCH_STATE[batch_id] = restored
+        return
+    await compute_embeddings_task(batch_id, features)
+
+def _build_tile_index(features: list[dict]) -> tuple:
+    # Points paired with their path (which directly follows them), plus web-mercator
+    # positions in [0, 1); point indices sorted by x let a tile scan only its column strip
+    points, paths = [], []
+    for f in features:
+        if f["geometry"]["type"] == "LineString":
+            if points:
+                paths[-1] = f
+            continue
+        points.append(f)
+        paths.append(None)
+    coords = np.array([f["geometry"]["coordinates"] for f in points], dtype=np.float64).reshape(-1, 2)
+    lon, lat = coords[:, 0], coords[:, 1]
+    lat_rad = np.radians(np.clip(lat, -85.0511, 85.0511))
+    mx = (lon + 180.0) / 360.0
+    my = (1.0 - np.log(np.tan(lat_rad) + 1.0 / np.cos(lat_rad)) / np.pi) / 2.0
+    order = np.argsort(mx, kind="stable")
+    return (features, order, mx[order], mx, my, lon, lat, points, paths)
+
+def _tile_features(index: tuple, z: int, x: int, y: int) -> list[dict]:
+    _, order, sorted_mx, mx, my, lon, lat, points, paths = index
+    # n is a power of two, so the strip bounds and tile-unit positions are exact
+    n = 2 ** z
+    lo, hi = np.searchsorted(sorted_mx, [x / n, (x + 1) / n], side="left")
+    strip = np.sort(order[lo:hi])  # original order keeps output stable
+    ty = my[strip] * n - y
+    inside = strip[(ty >= 0) & (ty < 1)]
+    tx = mx[inside] * n - x
+    ty = my[inside] * n - y
+
+    if z >= TILE_MAX_CLUSTER_ZOOM:
+        features = []
+        for i in inside.tolist():
+            features.append(points[i])
+            if paths[i] is not None:
+                features.append(paths[i])
+        return features
+
+    cells = (ty * TILE_CLUSTER_GRID).astype(np.int64) * TILE_CLUSTER_GRID + (tx * TILE_CLUSTER_GRID).astype(np.int64)
+    _, cell_of, counts = np.unique(cells, return_inverse=True, return_counts=True)
+    cell_lon = np.bincount(cell_of, weights=lon[inside]) / counts
+    cell_lat = np.bincount(cell_of, weights=lat[inside]) / counts
+
+    features = []
+    emitted = set()
+    for i, cell in zip(inside.tolist(), cell_of.tolist()):
+        if counts[cell] == 1:
+            features.append(points[i])
+            if paths[i] is not None:
+                features.append(paths[i])
+        elif cell not in emitted:
+            emitted.add(cell)
             features.append({
                 "type": "Feature",
-                "geometry": {
-                    "type": "LineString",
-                    "coordinates": [[lon_start, lat_start], [lon_end, lat_end]]
-                },
-                "properties": {**props, "type": "path"}
+                "geometry": { "type": "Point", "coordinates": [float(cell_lon[cell]), float(cell_lat[cell])] },
+                "properties": { "type": "cluster", "cluster": True, "point_count": int(counts[cell]) }
             })
-
     return features
 
+@app.get("/api/tiles/{batch_id}/{z}/{x}/{y}.geojson")
+async def get_tile(batch_id: str, z: int, x: int, y: int):
+    if not 0 <= z <= 24 or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail="Invalid tile coordinates")
+    features = BATCH_FEATURES.get(batch_id)
+    if features is None:
+        raise HTTPException(status_code=404, detail="Batch data not loaded.")
+    # Index and tile work run in threads so a burst of tile requests doesn't stall the loop;
+    # the TTLCaches themselves are only touched here, on the loop
+    index = TILE_INDEX.get(batch_id)
+    if index is None or index[0] is not features:
+        index = await asyncio.to_thread(_build_tile_index, features)
+        TILE_INDEX[batch_id] = index
+    return _geojson_response(await asyncio.to_thread(_tile_features, index, z, x, y))
+
 @app.post("/api/visualize")
 async def get_geojson_data(request: BatchRequest, background_tasks: BackgroundTasks):
     try:
@@ -246,44 +809,50 @@ async def get_geojson_data(request: BatchRequest, background_tasks: BackgroundTa
 
         if source == "mock":
             features = _mock_features(request.filter)
-            if features:
-                background_tasks.add_task(compute_embeddings_task, batch_id, features)
-            return { "type": "FeatureCollection", "features": features }
+            BATCH_FEATURES[batch_id] = features
+            background_tasks.add_task(_embed_batch, batch_id, features)
+            if request.bbox or request.limit is not None or request.offset:
+                return _geojson_response(_window_features(features, request))
+            return _geojson_response(features)
 
         if not request.batchId:
             raise HTTPException(status_code=400, detail="batchId is required for live source")
 
         if not API_KEY:
             raise HTTPException(500, "API Key missing")
-        client = NomadicML(api_key=API_KEY)
-        
-        loop = asyncio.get_event_loop()
-        print(f"Fetching batch {request.batchId}...")
-        
-        raw_data = await loop.run_in_executor(
-            None, 
-            lambda: client.get_batch_analysis(
-                request.batchId, 
-                filter=request.filter.lower() if request.filter and request.filter.lower() != "all" else None
+        analysis_filter = request.filter.lower() if request.filter and request.filter.lower() != "all" else None
+        cache_key = (request.batchId, analysis_filter)
+        cached = BATCH_ANALYSIS_CACHE.get(cache_key)
+        if cached is None:
+            client = get_nomadic_client()
+            
+            loop = asyncio.get_event_loop()
+            print(f"Fetching batch {request.batchId}...")
+            
+            raw_data = await loop.run_in_executor(
+                None, 
+                lambda: client.get_batch_analysis(request.batchId, filter=analysis_filter)
             )
-        )
+            # One random prefix per fetched response plus a counter keeps ids unique without a
+            # uuid4() per event; it is cached with the response so every page of it shares ids
+            cached = (raw_data, uuid.uuid4().hex[:12])
+            BATCH_ANALYSIS_CACHE[cache_key] = cached
+        raw_data, id_prefix = cached
 
-        features = []
         unique_video_ids = {r.get('video_id') for r in raw_data.get('results', []) if r.get('video_id')}
 
-        async def fetch_url_safe(vid):
-            url = await loop.run_in_executor(None, lambda: get_signed_video_url(vid))
-            return vid, url
-
-        if unique_video_ids:
-            url_results = await asyncio.gather(*(fetch_url_safe(vid) for vid in unique_video_ids))
-            url_cache = dict(url_results)
-        else:
-            url_cache = {}
+        async with asyncio.TaskGroup() as tg:
+            url_tasks = {vid: tg.create_task(get_signed_video_url(vid)) for vid in unique_video_ids}
+        url_cache = {vid: task.result() for vid, task in url_tasks.items()}
 
+        # 1. Keep events with a usable start/end GPS fix, collecting their times column-wise.
+        # Overlapping inference windows can report an event twice; keep the first.
+        events = []
+        seen = set()
+        t_starts = []
+        t_ends = []
         for result in raw_data.get('results', []):
             vid_id = result.get('video_id')
-            video_url = url_cache.get(vid_id)
             
             for event in result.get('events', []):
                 overlay = event.get('overlay', {})
@@ -294,81 +863,99 @@ async def get_geojson_data(request: BatchRequest, background_tasks: BackgroundTa
                     lon_end = float(overlay['frame_gps_lon']['end'])
                 except (KeyError, ValueError, TypeError):
                     continue 
+                # Zero is a valid coordinate; only NaN/inf (which serialize as null) are dropped
+                if not math.isfinite(lat_start + lon_start + lat_end + lon_end):
+                    continue
+                key = (vid_id, event.get('label'), event.get('t_start'), round(lat_start, EVENT_DEDUP_DECIMALS), round(lon_start, EVENT_DEDUP_DECIMALS))
+                if key in seen:
+                    continue
+                seen.add(key)
+
+                events.append((vid_id, event, lat_start, lon_start, lat_end, lon_end))
+                t_starts.append(event.get('t_start'))
+                t_ends.append(event.get('t_end'))
+
+        # 2. Parse all "m:ss" times at once; events without an end last DEFAULT_EVENT_DURATION_MS
+        offsets = timestamps_to_seconds(t_starts)
+        has_start = np.array([bool(t) for t in t_starts], dtype=bool)
+        has_end = np.array([bool(e) and e != s for s, e in zip(t_starts, t_ends)], dtype=bool)
+        ts_start = np.where(has_start, BASE_EPOCH_MS + offsets * 1000, 0)
+        ts_end = np.where(
+            has_end,
+            BASE_EPOCH_MS + timestamps_to_seconds(t_ends) * 1000,
+            np.where(has_start, ts_start + DEFAULT_EVENT_DURATION_MS, 0),
+        )
 
-                t_start_str = event.get('t_start')
-                t_end_str = event.get('t_end')
-                ts_start = convert_to_iso_time(t_start_str)
-                
-                if t_end_str and t_end_str != t_start_str:
-                    ts_end = convert_to_iso_time(t_end_str)
-                else:
-                    ts_end = convert_to_iso_time(t_start_str, default_duration_sec=5)
-
+        # 3. Build features lazily; the response streams them as they are produced
+        def build_features():
+            rows = zip(events, t_starts, ts_start.tolist(), ts_end.tolist(), offsets.tolist())
+            for i, ((vid_id, event, lat_start, lon_start, lat_end, lon_end), t_start_str, t0, t1, offset) in enumerate(rows):
                 props = {
-                    "id": str(uuid.uuid4()),
+                    "id": f"{id_prefix}-{i}",
                     "label": event.get('label'),
                     "severity": event.get('severity', 'low'),
                     "status": event.get('approval', 'Unknown'),
                     "time_str": t_start_str,
-                    "timestamp": ts_start,
-                    "timestamp_end": ts_end,
+                    "timestamp": t0,
+                    "timestamp_end": t1,
                     "description": event.get('aiAnalysis'),
                     "video_id": vid_id, 
-                    "video_url": video_url,
-                    "video_offset": timestamp_to_seconds(t_start_str),
+                    "video_url": url_cache.get(vid_id),
+                    "video_offset": offset,
                     "is_moving": (lat_start != lat_end)
                 }
 
-                features.append({
-                    "type": "Feature",
-                    "geometry": { "type": "Point", "coordinates": [lon_start, lat_start] },
-                    "properties": {**props, "type": "point"}
-                })
+                yield from _event_features(props, lon_start, lat_start, lon_end, lat_end)
 
-                if props["is_moving"]:
-                    features.append({
-                        "type": "Feature",
-                        "geometry": { 
-                            "type": "LineString", 
-                            "coordinates": [[lon_start, lat_start], [lon_end, lat_end]] 
-                        },
-                        "properties": {**props, "type": "path"}
-                    })
+        if request.bbox or request.limit is not None or request.offset:
+            # The embedding task needs every event, so build them all before windowing
+            features = list(build_features())
+            BATCH_FEATURES[request.batchId] = features
+            background_tasks.add_task(_embed_batch, request.batchId, features)
+            return _geojson_response(_window_features(features, request))
 
-        if features:
-            background_tasks.add_task(compute_embeddings_task, request.batchId, features)
+        features = []
+        background_tasks.add_task(_embed_batch, request.batchId, features)
 
-        return { "type": "FeatureCollection", "features": features }
+        return _geojson_response(build_features(), on_complete=features.extend)
 
     except Exception as e:
         print(f"Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@lru_cache(maxsize=1024)
+def _embed_query(query: str) -> np.ndarray:
+    # Repeat searches skip the OpenAI round-trip; the cached array is shared, so freeze it
+    response = get_openai_client().embeddings.create(
+        input=[query],
+        model=EMBEDDING_MODEL
+    )
+    embedding = _normalize_rows(np.array(response.data[0].embedding, dtype=np.float32))
+    embedding.flags.writeable = False
+    return embedding
+
 @app.post("/api/ai-search")
 async def ai_search(request: SearchRequest):
     try:
-        if request.batchId not in BATCH_EMBEDDINGS:
+        state = _get_batch_state(request.batchId)
+        if state is None:
             raise HTTPException(status_code=404, detail="Batch data not loaded.")
 
-        response = openai_client.embeddings.create(
-            input=[request.query],
-            model="text-embedding-3-small"
-        )
-        query_embedding = np.array(response.data[0].embedding)
+        query = request.query.strip().lower()
+        matching_ids = state.search_results.get(query)
+        if matching_ids is not None:
+            return { "matching_ids": matching_ids }
+
+        query_embedding = _embed_query(query)
         
-        batch_embeddings = BATCH_EMBEDDINGS[request.batchId]
-        cos_scores = np.dot(batch_embeddings, query_embedding)
+        cos_scores = _similarity_scores(state.embeddings, query_embedding)
         
-        top_indices = np.where(cos_scores > 0.40)[0]
-
-        matching_ids = []
-        seen_ids = set()
+        # Threshold the distinct rows, then broadcast a 1-byte mask to events
+        top_indices = np.flatnonzero((cos_scores > SEARCH_THRESHOLD)[state.rows])
 
-        for i in top_indices.tolist():
-            vid = BATCH_IDS[request.batchId][i]
-            if vid not in seen_ids:
-                matching_ids.append(vid)
-                seen_ids.add(vid)
+        # Rows are one per event id; the client matches both point and path features by id
+        matching_ids = state.ids[top_indices].tolist()
+        state.search_results[query] = matching_ids
         
         return { "matching_ids": matching_ids }
 
@@ -379,7 +966,7 @@ async def ai_search(request: SearchRequest):
 @app.post("/api/video-url")
 async def refresh_video_url(request: VideoRequest):
     try:
-        url = get_signed_video_url(request.videoId, force_refresh=True)
+        url = await get_signed_video_url(request.videoId, force_refresh=True)
         if not url:
             raise HTTPException(status_code=404, detail="Video not found")
         return {"url": url}